@@ -0,0 +1,176 @@
+"""
+Pulls the toolCallId and tool arguments out of a Vapi webhook body.
+
+Kept free of FastAPI/msgspec so it can be compiled with mypyc on its own
+(see README); server.py imports it either way.
+"""
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+# Tool arguments that must be present (and non-empty) to lodge a request.
+# Kept ordered so the "missing fields" message is stable.
+VAPI_REQUIRED_FIELDS = ("subject", "request_type", "resident_name", "resident_phone", "address", "details")
+# Any of these keys marks a dict as the tool arguments themselves.
+VAPI_ARG_KEYS = frozenset(("to",) + VAPI_REQUIRED_FIELDS)
+
+# (toolCallId, arguments). The id is whatever the payload carried (normally a
+# str); typed Any so compiled builds don't reject odd payloads at runtime.
+ToolCall = Tuple[Any, Dict[str, Any]]
+
+# Opening bracket -> the closing bracket a JSON object/array string must end with.
+_JSON_BOUNDS = {"{": "}", "[": "]"}
+# Strings at least this long are parsed every time rather than memoized.
+_JSON_CACHE_MAX_LEN = 4096
+# Enclosing toolCallId of the root node: there is none, so the root's own id
+# is returned as-is (even if falsy) rather than or-ed with a fallback.
+_NO_ID = object()
+
+
+@lru_cache(maxsize=1024)
+def _parse_json_str(s: str) -> Any:
+    """orjson.loads, or None if s isn't valid JSON.
+
+    Vapi repeats the same argument strings across calls and within one
+    envelope, so parses are memoized. Results are shared: treat as read-only.
+    """
+    try:
+        return orjson.loads(s)
+    except Exception:
+        return None
+
+
+def try_json_loads(val: Any) -> Any:
+    if isinstance(val, str) and val:
+        # Only pay for strip() when the string is actually padded.
+        s = val.strip() if val[0].isspace() or val[-1].isspace() else val
+        if s and _JSON_BOUNDS.get(s[0]) == s[-1]:
+            if len(s) < _JSON_CACHE_MAX_LEN:
+                parsed = _parse_json_str(s)
+            else:
+                parsed = _parse_json_str.__wrapped__(s)
+            return val if parsed is None else parsed
+    return val
+
+
+def extract_toolcall_and_args(raw: Any) -> ToolCall:
+    """
+    Supports common Vapi shapes:
+    - {"toolCalls":[{"id":"...", "function":{"arguments":"{...}"}}]}
+    - {"toolCallId":"...", "arguments":{...}}
+    - nested wrappers
+    Returns (toolCallId, args_dict)
+
+    Depth-first walk over an explicit stack (no recursion). Each entry carries
+    the nearest enclosing toolCallId so the id and args come out of one pass.
+    Input is always fresh JSON-decoded data, so exact `type(x) is dict/list`
+    checks stand in for isinstance.
+    """
+    stack: List[Tuple[Any, Any]] = [(raw, _NO_ID)]
+    is_root = True
+    while stack:
+        node, outer_id = stack.pop()
+        if type(node) is str:
+            node = try_json_loads(node)
+        found: Optional[ToolCall] = None
+
+        if type(node) is dict:
+            # direct toolCallId patterns
+            tool_call_id = node.get("toolCallId") or node.get("tool_call_id")
+
+            # If direct args
+            if not VAPI_ARG_KEYS.isdisjoint(node):
+                found = tool_call_id, node
+                tc = None
+            else:
+                tc = node.get("toolCalls") or node.get("tool_calls") or node.get("toolCallList")
+
+            # toolCalls list
+            if type(tc) is list and len(tc) > 0:
+                first = tc[0]
+                if type(first) is dict:
+                    tool_call_id = tool_call_id or first.get("id") or first.get("toolCallId")
+                    fn = first.get("function") if type(first.get("function")) is dict else None
+                    if fn and "arguments" in fn:
+                        args = try_json_loads(fn.get("arguments"))
+                        if type(args) is dict:
+                            found = tool_call_id, args
+
+                    # Sometimes args are directly under the tool call
+                    if found is None and "arguments" in first:
+                        args = try_json_loads(first.get("arguments"))
+                        if type(args) is dict:
+                            found = tool_call_id, args
+
+            # function wrapper
+            if found is None and "function" in node and type(node["function"]) is dict:
+                fn = node["function"]
+                tool_call_id = tool_call_id or node.get("id")
+                if "arguments" in fn:
+                    args = try_json_loads(fn.get("arguments"))
+                    if type(args) is dict:
+                        found = tool_call_id, args
+
+            if found is not None:
+                if outer_id is not _NO_ID:
+                    found = found[0] or outer_id, found[1]
+                # A match with empty args ends the search only at the top
+                # level; deeper down it just prunes that subtree.
+                if found[1] or is_root:
+                    return found
+            else:
+                # walk all values, first value first
+                inner_id = tool_call_id if outer_id is _NO_ID else tool_call_id or outer_id
+                stack.extend(zip(reversed(node.values()), repeat(inner_id)))
+
+        elif type(node) is list:
+            stack.extend(zip(reversed(node), repeat(outer_id)))
+
+        is_root = False
+
+    return None, {}
+
+
+def extract_known_shape(raw: Any) -> Optional[ToolCall]:
+    """
+    Fast path for the usual Vapi envelopes, tried before the generic walk:
+    - {"toolCalls":[{"id":"...", "function":{"arguments":...}}]}
+    - {"message":{"toolCalls":[...]}}  (also tool_calls / toolCallList)
+    Returns None unless the walk would provably stop at the same tool call:
+    argument keys beside the tool calls, a "function" wrapper, "message" not
+    being the first key, etc. all defer to extract_toolcall_and_args.
+    """
+    container = raw
+    outer_id: Any = None
+    for depth in (0, 1):
+        if type(container) is not dict or not VAPI_ARG_KEYS.isdisjoint(container):
+            return None  # the walk returns a dict holding argument keys as-is
+        tool_call_id = container.get("toolCallId") or container.get("tool_call_id")
+        tc: Any = container.get("toolCalls") or container.get("tool_calls") or container.get("toolCallList")
+        if tc:
+            try:
+                first = tc[0]
+                args = try_json_loads(first["function"]["arguments"])
+            except (KeyError, IndexError, TypeError):
+                return None
+            if type(tc) is not list or type(first) is not dict or type(args) is not dict:
+                return None
+            tid = tool_call_id or first.get("id") or first.get("toolCallId")
+            if depth == 0:
+                return tid, args
+            if not args:
+                return None  # nested empty args: the walk keeps searching
+            return tid or outer_id, args
+        # No tool calls here: the walk would try a "function" wrapper, then
+        # each value in order; only follow "message" if it comes first.
+        if depth or "function" in container or next(iter(container), None) != "message":
+            return None
+        outer_id = tool_call_id
+        container = container["message"]
+    return None
+
+
+def extract_vapi_args(raw: Any) -> ToolCall:
+    return extract_known_shape(raw) or extract_toolcall_and_args(raw)
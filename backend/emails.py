@@ -1,46 +1,274 @@
+import asyncio
+import logging
 import os
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
+from typing import Dict, List, Optional, Tuple
 
+import httpx
+from jinja2 import DictLoader, Environment
 
-class EmailDeliveryError(Exception):
-    pass
 
+class EmailDeliveryError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        # False when Brevo rejected the request outright (4xx other than 429):
+        # sending the same body again would fail the same way.
+        self.retryable = retryable
 
-def _get_brevo_api_instance():
-    configuration = sib_api_v3_sdk.Configuration()
-    configuration.api_key["api-key"] = os.environ.get("BREVO_API_KEY")
-    return sib_api_v3_sdk.TransactionalEmailsApi(
-        sib_api_v3_sdk.ApiClient(configuration)
-    )
 
+# Process-lifetime config: read once at import (server.py loads .env first).
+_BREVO_API_KEY = os.environ.get("BREVO_API_KEY")
+_SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
+_RECIPIENT_EMAIL = os.environ.get("RECIPIENT_EMAIL")
+_COUNCIL_INBOX_EMAIL = os.environ.get("COUNCIL_INBOX_EMAIL")
 
-def send_contact_notification(name: str, email: str, phone: str, message: str):
-    api_instance = _get_brevo_api_instance()
+# One pooled client per app lifetime (opened by start_email_batcher, closed by
+# close_email_client): keep-alive connections (and TLS sessions) to Brevo are
+# reused across sends, and requests never block the event loop. HTTP/2 lets
+# concurrent sends share a single connection.
+_client: Optional[httpx.AsyncClient] = None
 
-    sender_email = os.environ.get("SENDER_EMAIL")
-    recipient_email = os.environ.get("RECIPIENT_EMAIL")
 
-    email_obj = sib_api_v3_sdk.SendSmtpEmail(
-        sender={"email": sender_email, "name": "Aspire Executive Solutions"},
-        to=[{"email": recipient_email}],
-        subject="New Contact Form Submission",
-        html_content=f"""
+# Bodies are compiled once at import; each send only renders. Autoescape
+# covers every value, since names/messages/tool payloads are user-supplied.
+_CONTACT_HTML = """
             <h2>New Contact Form Submission</h2>
-            <p><strong>Name:</strong> {name}</p>
-            <p><strong>Email:</strong> {email}</p>
-            <p><strong>Phone:</strong> {phone}</p>
-            <p><strong>Message:</strong> {message}</p>
-        """,
-    )
+            <p><strong>Name:</strong> {{ name }}</p>
+            <p><strong>Email:</strong> {{ email }}</p>
+            <p><strong>Phone:</strong> {{ phone }}</p>
+            <p><strong>Message:</strong> {{ message }}</p>
+        """
+
+_COUNCIL_HTML = """
+        <h2>New Council Request – {{ request_type }}</h2>
+        <p><strong>Name:</strong> {{ resident_name }}</p>
+        <p><strong>Phone:</strong> {{ resident_phone }}</p>
+        <p><strong>Email:</strong> {{ resident_email }}</p>
+        <p><strong>Address:</strong> {{ address }}</p>
+        <p><strong>Preferred contact:</strong> {{ preferred_contact_method }}</p>
+        <p><strong>Urgency:</strong> {{ urgency }}</p>
+        <p><strong>Details:</strong><br>{{ details }}</p>
+        <h3>Extra metadata</h3>
+        <pre>{{ extra_metadata }}</pre>
+        <hr>
+        <p style="font-size:12px;color:#666;">
+          Tool payload 'to' (ignored for delivery): {{ to }}
+        </p>
+    """
+
+_env = Environment(
+    loader=DictLoader({"contact": _CONTACT_HTML, "council": _COUNCIL_HTML}),
+    autoescape=True,
+    auto_reload=False,
+)
+_contact_tmpl = _env.get_template("contact")
+_council_tmpl = _env.get_template("council")
+
+# Council template field -> fallback when the key is absent from the payload.
+_COUNCIL_FIELDS = (
+    ("request_type", ""),
+    ("resident_name", ""),
+    ("resident_phone", ""),
+    ("resident_email", "N/A"),
+    ("address", ""),
+    ("preferred_contact_method", "N/A"),
+    ("urgency", "Normal"),
+    ("details", ""),
+    ("to", ""),
+)
+
+
+# Shared retry policy for queued sends (also used by server.py's email workers).
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_DELAY = 30  # seconds before the first retry; doubles each time
+
+
+# Contact notifications are coalesced: everything queued within one window is
+# sent as a single Brevo call with one messageVersions entry per submission.
+# Callers hand off and return; failed batches are retried by the flusher.
+_BATCH_WINDOW = 0.05  # seconds
+_BATCH_MAX = 1000  # Brevo's messageVersions limit
+_PENDING_MAX = 10000
 
+_pending: List[Tuple[dict, int]] = []  # (messageVersions entry, attempt)
+_pending_ready: Optional[asyncio.Event] = None  # bound to the running loop at startup
+_flusher: Optional[asyncio.Task] = None
+# Failed batches waiting out their backoff, by timer (dropped, with a log, at close).
+_retry_timers: Dict[asyncio.TimerHandle, List[Tuple[dict, int]]] = {}
+
+
+def check_email_config():
+    """Fail fast at startup rather than on the first real send."""
+    missing = [
+        name
+        for name, value in (
+            ("BREVO_API_KEY", _BREVO_API_KEY),
+            ("SENDER_EMAIL", _SENDER_EMAIL),
+            ("COUNCIL_INBOX_EMAIL / RECIPIENT_EMAIL", _COUNCIL_INBOX_EMAIL or _RECIPIENT_EMAIL),
+        )
+        if not value
+    ]
+    if missing:
+        raise RuntimeError(f"Missing email environment variables: {', '.join(missing)}")
+
+
+def start_email_batcher():
+    global _client, _pending_ready, _flusher
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url="https://api.brevo.com",
+            headers={"api-key": _BREVO_API_KEY or "", "accept": "application/json"},
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+            http2=True,
+        )
+    if _flusher is None:
+        _pending_ready = asyncio.Event()
+        if _pending:
+            _pending_ready.set()
+        _flusher = asyncio.create_task(_run_flusher())
+
+
+async def close_email_client():
+    global _client, _pending_ready, _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    while _pending:
+        await _flush_contact_batch()
+    if _retry_timers:
+        logging.warning(
+            "Shutting down with %d contact email(s) awaiting retry; dropping them.",
+            sum(len(items) for items in _retry_timers.values()),
+        )
+        for handle in _retry_timers:
+            handle.cancel()
+        _retry_timers.clear()
+    _pending_ready = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _send_transac_email(body: dict):
+    if _client is None:
+        raise EmailDeliveryError("Email client not started (start_email_batcher)")
     try:
-        return api_instance.send_transac_email(email_obj)
-    except ApiException as e:
-        raise EmailDeliveryError(f"Brevo API error: {e}")
+        r = await _client.post("/v3/smtp/email", json=body)
+        r.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        raise EmailDeliveryError(
+            f"Brevo API error: {status} {e.response.text}",
+            retryable=status >= 500 or status == 429,
+        )
+    except httpx.HTTPError as e:
+        raise EmailDeliveryError(f"Brevo API error: {e!r}")
+    # {"messageId": "..."} or {"messageIds": [...]} for messageVersions
+    return r.json()
+
+
+async def _run_flusher():
+    while True:
+        await _pending_ready.wait()
+        if len(_pending) < _BATCH_MAX:
+            await asyncio.sleep(_BATCH_WINDOW)
+        await _flush_contact_batch()
 
 
-def send_council_request_email(payload: dict):
+async def _flush_contact_batch():
+    batch = _pending[:_BATCH_MAX]
+    del _pending[:_BATCH_MAX]
+    if not _pending and _pending_ready is not None:
+        _pending_ready.clear()
+    if not batch:
+        return
+
+    versions = [version for version, _ in batch]
+    body = {
+        "sender": {"email": _SENDER_EMAIL, "name": "Aspire Executive Solutions"},
+        "subject": "New Contact Form Submission",
+        "to": versions[0]["to"],
+        "htmlContent": versions[0]["htmlContent"],
+    }
+    if len(versions) > 1:
+        body["messageVersions"] = versions
+
+    try:
+        await _send_transac_email(body)
+    except asyncio.CancelledError:
+        # Shutdown mid-send: put the batch back so close_email_client sends it.
+        _pending[:0] = batch
+        raise
+    except Exception as e:
+        _retry_contact_batch(batch, isinstance(e, EmailDeliveryError) and e.retryable)
+
+
+def _retry_contact_batch(batch: List[Tuple[dict, int]], retryable: bool):
+    retry: dict = {}
+    dropped = 0
+    for version, attempt in batch:
+        if retryable and attempt < EMAIL_MAX_RETRIES:
+            retry.setdefault(attempt, []).append((version, attempt + 1))
+        else:
+            dropped += 1
+    for attempt, items in retry.items():
+        delay = EMAIL_RETRY_DELAY * 2 ** attempt
+        logging.warning(
+            "Contact email batch failed (%d message(s), attempt %d); retrying in %ds.",
+            len(items), attempt + 1, delay, exc_info=True,
+        )
+        _schedule_contact_retry(items, delay)
+    if dropped:
+        logging.error("Contact email batch failed; dropping %d message(s).", dropped, exc_info=True)
+
+
+def _schedule_contact_retry(items: List[Tuple[dict, int]], delay: float):
+    def fire():
+        del _retry_timers[handle]
+        _requeue_contact_versions(items)
+
+    handle = asyncio.get_running_loop().call_later(delay, fire)
+    _retry_timers[handle] = items
+
+
+def _requeue_contact_versions(items: List[Tuple[dict, int]]):
+    if _pending_ready is None:
+        return  # batcher stopped since the retry was scheduled
+    _pending.extend(items)
+    _pending_ready.set()
+
+
+def queue_contact_notification(name: str, email: str, phone: str, message: str) -> bool:
+    """Hand a contact notification to the batcher without waiting for delivery.
+
+    Returns False (and logs) if the batcher isn't running or its backlog is full.
+    """
+    if _pending_ready is None or len(_pending) >= _PENDING_MAX:
+        logging.warning("Contact email batcher unavailable or full; dropping notification.")
+        return False
+    _pending.append(({
+        "to": [{"email": _RECIPIENT_EMAIL}],
+        "htmlContent": _contact_tmpl.render(name=name, email=email, phone=phone, message=message),
+    }, 0))
+    _pending_ready.set()
+    return True
+
+
+async def send_contact_notification(name: str, email: str, phone: str, message: str):
+    """Send one contact notification immediately, outside the batcher."""
+    return await _send_transac_email({
+        "sender": {"email": _SENDER_EMAIL, "name": "Aspire Executive Solutions"},
+        "subject": "New Contact Form Submission",
+        "to": [{"email": _RECIPIENT_EMAIL}],
+        "htmlContent": _contact_tmpl.render(name=name, email=email, phone=phone, message=message),
+    })
+
+
+async def send_council_request_email(payload: dict):
     """
     Sends a structured council request email via Brevo.
 
@@ -49,51 +277,17 @@ def send_council_request_email(payload: dict):
     - Recipient is forced server-side using COUNCIL_INBOX_EMAIL (preferred),
       otherwise RECIPIENT_EMAIL.
     """
-    api_instance = _get_brevo_api_instance()
-
-    sender_email = os.environ.get("SENDER_EMAIL")
-
-    # FORCE recipient to a known inbox (do not trust payload["to"])
-    recipient_email = (
-        os.environ.get("COUNCIL_INBOX_EMAIL")
-        or os.environ.get("RECIPIENT_EMAIL")
-    )
-
-    if not sender_email:
-        raise EmailDeliveryError("Missing SENDER_EMAIL environment variable.")
-    if not recipient_email:
-        raise EmailDeliveryError("Missing COUNCIL_INBOX_EMAIL / RECIPIENT_EMAIL environment variable.")
-    if not os.environ.get("BREVO_API_KEY"):
-        raise EmailDeliveryError("Missing BREVO_API_KEY environment variable.")
-
     subject = payload.get("subject") or "New Council Request"
 
-    html_content = f"""
-        <h2>New Council Request – {payload.get('request_type', '')}</h2>
-        <p><strong>Name:</strong> {payload.get('resident_name', '')}</p>
-        <p><strong>Phone:</strong> {payload.get('resident_phone', '')}</p>
-        <p><strong>Email:</strong> {payload.get('resident_email', 'N/A')}</p>
-        <p><strong>Address:</strong> {payload.get('address', '')}</p>
-        <p><strong>Preferred contact:</strong> {payload.get('preferred_contact_method', 'N/A')}</p>
-        <p><strong>Urgency:</strong> {payload.get('urgency', 'Normal')}</p>
-        <p><strong>Details:</strong><br>{payload.get('details', '')}</p>
-        <h3>Extra metadata</h3>
-        <pre>{payload.get('extra_metadata') or ''}</pre>
-        <hr>
-        <p style="font-size:12px;color:#666;">
-          Tool payload 'to' (ignored for delivery): {payload.get('to', '')}
-        </p>
-    """
-
-    email_obj = sib_api_v3_sdk.SendSmtpEmail(
-        sender={"email": sender_email, "name": "Aspire AI – Hinchinbrook"},
-        to=[{"email": recipient_email}],
-        subject=subject,
-        html_content=html_content,
-    )
+    fields = {k: payload.get(k, default) for k, default in _COUNCIL_FIELDS}
+    fields["extra_metadata"] = payload.get("extra_metadata") or ""
+    html_content = _council_tmpl.render(fields)
 
-    try:
-        # Returns a CreateSmtpEmail object (messageId, etc.)
-        return api_instance.send_transac_email(email_obj)
-    except ApiException as e:
-        raise EmailDeliveryError(f"Brevo API error: {e}")
+    # Returns {"messageId": "..."}
+    return await _send_transac_email({
+        "sender": {"email": _SENDER_EMAIL, "name": "Aspire AI – Hinchinbrook"},
+        # FORCE recipient to a known inbox (do not trust payload["to"])
+        "to": [{"email": _COUNCIL_INBOX_EMAIL or _RECIPIENT_EMAIL}],
+        "subject": subject,
+        "htmlContent": html_content,
+    })
@@ -1,22 +1,44 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Body, Header
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from starlette.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, Any, Dict, List, Tuple
+from starlette.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, Any, Callable, Dict, List, Tuple, Union
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient, WriteConcern
+from pymongo.errors import OperationFailure
 from pathlib import Path
-import os, uuid, logging, json
-from datetime import datetime
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio, os, logging, hashlib, hmac, json, re, time
+import diskcache
+import msgspec
+import orjson
+from datetime import datetime, timezone
 
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / ".env")
+
+logging.basicConfig(level=logging.INFO)
+
+# emails reads its configuration at import, so it must come after load_dotenv.
 from emails import (
     send_contact_notification,
+    queue_contact_notification,
     EmailDeliveryError,
     send_council_request_email,
+    check_email_config,
+    start_email_batcher,
+    close_email_client,
+    EMAIL_MAX_RETRIES,
+    EMAIL_RETRY_DELAY,
 )
+from _vapi_unwrap import VAPI_ARG_KEYS, VAPI_REQUIRED_FIELDS, extract_vapi_args, try_json_loads
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / ".env")
+# Process-lifetime settings, read once here instead of per request.
+BREVO_API_KEY = os.environ.get("BREVO_API_KEY")
+SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
+RECIPIENT_EMAIL = os.environ.get("RECIPIENT_EMAIL")
 
 # --------------------------------------------------------------------------------------
 # MongoDB (CONTACT FORM ONLY; OPTIONAL)
@@ -24,56 +46,111 @@ load_dotenv(ROOT_DIR / ".env")
 # --------------------------------------------------------------------------------------
 MONGO_URL = os.environ.get("MONGO_URL")  # leave unset to disable Mongo entirely
 DB_NAME = os.environ.get("DB_NAME", "app_db")
+# Submissions older than this are expired by Mongo's TTL monitor.
+CONTACT_RETENTION_DAYS = int(os.environ.get("CONTACT_RETENTION_DAYS", "365"))
+if CONTACT_RETENTION_DAYS <= 0:
+    # 0 would make Mongo delete every submission within a minute of storing it.
+    raise RuntimeError(f"CONTACT_RETENTION_DAYS must be at least 1 (got {CONTACT_RETENTION_DAYS})")
 
-mongo_client: Optional[AsyncIOMotorClient] = None
+mongo_client: Optional[AsyncMongoClient] = None
 mongo_db = None  # only used for contact form persistence
+# Storage is best-effort, so the request path doesn't wait for a write ack.
+contact_coll = None
 
 
 async def init_mongo():
-    global mongo_client, mongo_db
+    global mongo_client, mongo_db, contact_coll
 
     if not MONGO_URL:
         logging.info("Mongo not configured (MONGO_URL not set). Contact storage disabled.")
         mongo_client = None
         mongo_db = None
+        contact_coll = None
         return
 
     try:
-        mongo_client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=3000)
+        # Native asyncio driver (no executor thread hop per operation). Keep a
+        # small warm pool so the first /contact after idle doesn't pay for a
+        # fresh TCP + TLS + auth handshake.
+        mongo_client = AsyncMongoClient(
+            MONGO_URL,
+            serverSelectionTimeoutMS=3000,
+            maxPoolSize=20,
+            minPoolSize=5,
+            maxIdleTimeMS=60000,
+            retryWrites=True,
+            # Wire compression for the submission bodies (needs pymongo[zstd]).
+            compressors="zstd",
+        )
+        await mongo_client.aconnect()
         await mongo_client.admin.command("ping")
         mongo_db = mongo_client[DB_NAME]
+        await mongo_db.contact_submissions.find_one({}, {"_id": 1})
+        contact_coll = mongo_db.get_collection(
+            "contact_submissions", write_concern=WriteConcern(w=0)
+        )
         logging.info("Mongo connected (contact form storage enabled).")
     except Exception as e:
-        logging.warning(f"Mongo unavailable; continuing without it. Error: {repr(e)}")
+        logging.warning("Mongo unavailable; continuing without it. Error: %r", e)
+        if mongo_client is not None:
+            await mongo_client.close()
         mongo_client = None
         mongo_db = None
+        contact_coll = None
+        return
+
+    # Index setup is best-effort: storage still works without it.
+    try:
+        await _ensure_contact_indexes(mongo_db)
+    except Exception as e:
+        logging.warning("Could not ensure contact_submissions indexes: %r", e)
+
+
+async def _ensure_contact_indexes(db):
+    ttl = CONTACT_RETENTION_DAYS * 86400
+    try:
+        await db.contact_submissions.create_index("timestamp", expireAfterSeconds=ttl)
+    except OperationFailure as e:
+        if e.code != 85:  # IndexOptionsConflict: the TTL index exists with another retention
+            raise
+        await db.command(
+            "collMod", "contact_submissions",
+            index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": ttl},
+        )
+        logging.info("Contact retention changed to %d day(s).", CONTACT_RETENTION_DAYS)
+    await db.contact_submissions.create_index("email")
+    # Lookups by the id returned to the submitter; UUIDv7 keeps its inserts right-most.
+    await db.contact_submissions.create_index("id")
 
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 
 # -----------------------------
 # Models
 # -----------------------------
-class ContactSubmission(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    email: EmailStr
-    phone: Optional[str] = None
-    org: Optional[str] = None
-    message: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    status: str = "new"
+# Shape check only (one "@", a dotted domain, no whitespace); the notification
+# email is where a bad address gets noticed, so no RFC/IDNA parsing per request.
+# Domain labels exclude "." so there's only one way to match: linear time on
+# hostile input (the length cap below is the first line of defence).
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s.]+(?:\.[^@\s.]+)+")
+EMAIL_MAX_LEN = 254  # RFC 5321 path limit
 
 
 class ContactSubmissionCreate(BaseModel):
     name: str
-    email: EmailStr
+    email: str = Field(max_length=EMAIL_MAX_LEN, json_schema_extra={"format": "email"})
     phone: Optional[str] = None
     org: Optional[str] = None
     message: str
 
+    @field_validator("email")
+    @classmethod
+    def _check_email(cls, v: str) -> str:
+        if not _EMAIL_RE.fullmatch(v):
+            raise ValueError("value is not a valid email address")
+        return v
+
 
 class ContactResponse(BaseModel):
     status: str
@@ -81,100 +158,294 @@ class ContactResponse(BaseModel):
     id: str
 
 
-@app.on_event("startup")
-async def on_startup():
-    logging.basicConfig(level=logging.INFO)
-    await init_mongo()
+def _uuid7() -> str:
+    """Time-ordered UUIDv7 (RFC 9562): 48-bit Unix ms timestamp + 74 random bits.
+
+    Consecutive ids sort by creation time, so inserts into the `id` index
+    (created in init_mongo) append to the right-most B-tree page instead of
+    landing at random.
+    """
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    rand_a = (rand >> 68) & 0xFFF
+    rand_b = rand & ((1 << 62) - 1)
+    # Format the hyphenated form directly rather than via a uuid.UUID object.
+    h = f"{(ms << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _new_contact_doc(input: ContactSubmissionCreate) -> Dict[str, Any]:
+    """Stored contact_submissions document: the validated input plus id/timestamp/status."""
+    return {
+        "id": _uuid7(),
+        "name": input.name,
+        "email": input.email,
+        "phone": input.phone,
+        "org": input.org,
+        "message": input.message,
+        "timestamp": datetime.now(timezone.utc),
+        "status": "new",
+    }
+
+
+# -----------------------------
+# Email workers
+# Council emails are queued as (send_fn, args, attempt, on_give_up) jobs and
+# drained by a fixed set of workers, so a burst can't fan out into an unbounded
+# number of concurrent Brevo sends. Transient failures (transport errors, Brevo
+# 5xx/429) are re-queued with exponential backoff instead of pinning a worker
+# while they wait; anything else, or running out of retries, gives up and calls
+# on_give_up. (Contact emails go through the batcher in emails.py instead.)
+# Retries wait on timers, outside the queue; shutdown gives up on those too.
+# -----------------------------
+EMAIL_WORKERS = 5
+EMAIL_QUEUE_MAX = 10000
 
+_EmailJob = Tuple[Any, tuple, int, Optional[Callable[[], Any]]]
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+
+def _enqueue_email(queue: asyncio.Queue, job: _EmailJob) -> bool:
+    """Queue a send without blocking. Returns False (and logs) if the backlog is full."""
+    try:
+        queue.put_nowait(job)
+    except asyncio.QueueFull:
+        logging.warning("Email queue full; dropping %s.", job[0].__name__)
+        return False
+    return True
+
+
+def _requeue_email(queue: asyncio.Queue, job: _EmailJob):
+    # A retry that no longer fits is given up like any other final failure.
+    if not _enqueue_email(queue, job) and job[3] is not None:
+        job[3]()
+
+
+def _schedule_email_retry(
+    queue: asyncio.Queue, retries: Dict[asyncio.TimerHandle, _EmailJob], job: _EmailJob, delay: float
+):
+    def fire():
+        del retries[handle]
+        _requeue_email(queue, job)
+
+    handle = asyncio.get_running_loop().call_later(delay, fire)
+    retries[handle] = job
+
+
+def _abandon_email_retries(retries: Dict[asyncio.TimerHandle, _EmailJob]):
+    """Shutdown: cancel retries still waiting on their timer and give up on them."""
+    if not retries:
+        return
+    logging.warning("Shutting down with %d email retry(ies) pending; giving up on them.", len(retries))
+    for handle, job in retries.items():
+        handle.cancel()
+        if job[3] is not None:
+            job[3]()
+    retries.clear()
+
+
+async def _email_worker(queue: asyncio.Queue, retries: Dict[asyncio.TimerHandle, _EmailJob]):
+    while True:
+        send, args, attempt, on_give_up = await queue.get()
+        try:
+            await send(*args)
+        except Exception as e:
+            if isinstance(e, EmailDeliveryError) and e.retryable and attempt < EMAIL_MAX_RETRIES:
+                delay = EMAIL_RETRY_DELAY * 2 ** attempt
+                logging.warning(
+                    "%s failed (attempt %d); retrying in %ds.", send.__name__, attempt + 1, delay,
+                    exc_info=True,
+                )
+                _schedule_email_retry(queue, retries, (send, args, attempt + 1, on_give_up), delay)
+            else:
+                logging.exception("%s failed (attempt %d); giving up.", send.__name__, attempt + 1)
+                if on_give_up is not None:
+                    on_give_up()
+        finally:
+            queue.task_done()
+
+
+# -----------------------------
+# Contact inserts
+# Submissions are queued and written by a single background writer: whatever
+# piles up while one write is in flight goes out in the next insert_many.
+# -----------------------------
+CONTACT_BATCH_MAX = 100
+CONTACT_QUEUE_MAX = 10000
+
+
+async def _contact_writer(queue: asyncio.Queue):
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < CONTACT_BATCH_MAX and not queue.empty():
+            batch.append(queue.get_nowait())
+        try:
+            try:
+                await contact_coll.insert_many(batch, ordered=False)
+            except Exception:
+                # One retry for transient errors (e.g. a pooled connection that went stale).
+                logging.warning("Mongo insert of %d contact submission(s) failed; retrying once.", len(batch))
+                await contact_coll.insert_many(batch, ordered=False)
+        except Exception:
+            logging.exception(
+                "Mongo insert of %d contact submission(s) failed; continuing without DB persistence.",
+                len(batch),
+            )
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def _drain_and_stop(queue: asyncio.Queue, tasks: List[asyncio.Task], what: str):
+    try:
+        await asyncio.wait_for(queue.join(), timeout=10)
+    except asyncio.TimeoutError:
+        logging.warning("Timed out draining %s queue; dropping remaining items.", what)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     global mongo_client
+
+    check_email_config()
+    if not (CORS_ORIGINS or CORS_ORIGIN_REGEX):
+        logging.error(
+            "CORS_ORIGINS / CORS_ORIGIN_REGEX not set: browsers will be blocked from "
+            "calling this API (e.g. the contact form)."
+        )
+    await init_mongo()
+    start_email_batcher()
+
+    app.state.contact_queue = asyncio.Queue(maxsize=CONTACT_QUEUE_MAX)
+    app.state.contact_writers = (
+        [asyncio.create_task(_contact_writer(app.state.contact_queue))]
+        if contact_coll is not None
+        else []
+    )
+
+    app.state.email_queue = asyncio.Queue(maxsize=EMAIL_QUEUE_MAX)
+    app.state.email_retries = {}
+    app.state.email_workers = [
+        asyncio.create_task(_email_worker(app.state.email_queue, app.state.email_retries))
+        for _ in range(EMAIL_WORKERS)
+    ]
+
+    yield
+
+    # Flush pending contact inserts before the Mongo client goes away.
+    await _drain_and_stop(app.state.contact_queue, app.state.contact_writers, "contact insert")
     try:
         if mongo_client is not None:
-            mongo_client.close()
+            await mongo_client.close()
             mongo_client = None
     except Exception:
         pass
 
+    # Let queued emails go out before the HTTP client is closed (close_email_client
+    # flushes whatever contact notifications are still batched).
+    await _drain_and_stop(app.state.email_queue, app.state.email_workers, "council email")
+    _abandon_email_retries(app.state.email_retries)
+    await close_email_client()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+
+# Health-check target: serve pre-serialized bytes, no per-hit encoding.
+_ROOT_BYTES = orjson.dumps({"message": "Aspire Executive Solutions API"})
+
 
 @api_router.get("/")
 async def root():
-    return {"message": "Aspire Executive Solutions API"}
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 # -----------------------------
 # Contact form
 # -----------------------------
-@api_router.post("/contact", response_model=ContactResponse)
-async def create_contact_submission(input: ContactSubmissionCreate, background_tasks: BackgroundTasks):
-    contact_obj = ContactSubmission(**input.model_dump())
+# Hot path: skip response_model validation/encoding; ContactResponse stays for the docs.
+@api_router.post("/contact", responses={200: {"model": ContactResponse}})
+async def create_contact_submission(input: ContactSubmissionCreate):
+    doc = _new_contact_doc(input)
+
+    # 1) Best-effort DB persistence (Mongo optional), written in batches.
+    # Without Mongo the skip is logged once by init_mongo, not per request.
+    if contact_coll is not None:
+        try:
+            app.state.contact_queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            # Mongo has stalled; don't let submissions pile up in memory.
+            logging.warning("Contact insert queue full; not storing submission %s.", doc["id"])
+
+    # 2) Best-effort email (never break UX): handed to the batcher, not awaited
+    queue_contact_notification(
+        input.name,
+        input.email,
+        input.phone or "",
+        (f"Organisation: {input.org}\n\n" if input.org else "") + input.message,
+    )
 
-    # 1) Best-effort DB persistence (Mongo optional)
-    try:
-        if mongo_db is not None:
-            await mongo_db.contact_submissions.insert_one(contact_obj.model_dump())
-        else:
-            logging.info("Mongo disabled/unavailable; skipping DB insert.")
-    except Exception:
-        logging.exception("Mongo insert failed; continuing without DB persistence.")
+    return ORJSONResponse({
+        "status": "success",
+        "message": "Thank you for contacting us. We'll get back to you within 24 hours.",
+        "id": doc["id"],
+    })
 
-    # 2) Best-effort email (never break UX)
-    def _safe_send():
-        try:
-            send_contact_notification(
-                contact_obj.name,
-                contact_obj.email,
-                contact_obj.phone or "",
-                (f"Organisation: {contact_obj.org}\n\n" if contact_obj.org else "") + contact_obj.message,
-            )
-        except Exception:
-            logging.exception("Contact email send failed.")
 
-    background_tasks.add_task(_safe_send)
+# /debug/env is only served to callers presenting X-Debug-Token; with
+# DEBUG_TOKEN unset the route behaves as if it doesn't exist.
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN")
 
-    return ContactResponse(
-        status="success",
-        message="Thank you for contacting us. We'll get back to you within 24 hours.",
-        id=contact_obj.id,
-    )
 
+def _mask(v: Optional[str]):
+    if not v:
+        return None
+    return v[:4] + "..." + v[-4:] if len(v) > 8 else v
 
-@api_router.get("/debug/env")
-def debug_env():
-    def mask(v: Optional[str]):
-        if not v:
-            return None
-        return v[:4] + "..." + v[-4:] if len(v) > 8 else v
 
-    return {
-        "BREVO_API_KEY_set": bool(os.getenv("BREVO_API_KEY")),
-        "SENDER_EMAIL": os.getenv("SENDER_EMAIL"),
-        "RECIPIENT_EMAIL": os.getenv("RECIPIENT_EMAIL"),
-        "BREVO_API_KEY_preview": mask(os.getenv("BREVO_API_KEY")),
-        "MONGO_URL_set": bool(os.getenv("MONGO_URL")),
-        "DB_NAME": os.getenv("DB_NAME", "app_db"),
-    }
+# Settings are fixed for the process lifetime, so the payload is built once.
+_DEBUG_ENV_BYTES = orjson.dumps({
+    "BREVO_API_KEY_set": bool(BREVO_API_KEY),
+    "SENDER_EMAIL": SENDER_EMAIL,
+    "RECIPIENT_EMAIL": RECIPIENT_EMAIL,
+    "BREVO_API_KEY_preview": _mask(BREVO_API_KEY),
+    "MONGO_URL_set": bool(MONGO_URL),
+    "DB_NAME": DB_NAME,
+})
+
+
+@api_router.get("/debug/env", include_in_schema=False)
+async def debug_env(x_debug_token: Optional[str] = Header(None)):
+    if not (
+        DEBUG_TOKEN
+        and x_debug_token
+        and hmac.compare_digest(x_debug_token.encode(), DEBUG_TOKEN.encode())
+    ):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(_DEBUG_ENV_BYTES, media_type="application/json")
 
 
 @api_router.post("/contact/debug", response_model=ContactResponse)
 async def create_contact_submission_debug(input: ContactSubmissionCreate):
-    contact_obj = ContactSubmission(**input.model_dump())
+    doc = _new_contact_doc(input)
 
     try:
         if mongo_db is not None:
-            await mongo_db.contact_submissions.insert_one(contact_obj.model_dump())
+            await mongo_db.contact_submissions.insert_one(doc)
     except Exception:
         logging.exception("Mongo insert failed (debug).")
 
     try:
-        send_contact_notification(
-            contact_obj.name,
-            contact_obj.email,
-            contact_obj.phone or "",
-            (f"Organisation: {contact_obj.org}\n\n" if contact_obj.org else "") + contact_obj.message,
+        await send_contact_notification(
+            input.name,
+            input.email,
+            input.phone or "",
+            (f"Organisation: {input.org}\n\n" if input.org else "") + input.message,
         )
-        return ContactResponse(status="success", message="Email sent (debug).", id=contact_obj.id)
+        # response_model validates on the way out; don't validate here as well.
+        return ContactResponse.model_construct(status="success", message="Email sent (debug).", id=doc["id"])
     except EmailDeliveryError as e:
         raise HTTPException(status_code=502, detail=f"Email delivery failed: {str(e)}")
     except Exception as e:
@@ -185,97 +456,145 @@ async def create_contact_submission_debug(input: ContactSubmissionCreate):
 # -----------------------------
 # Vapi helpers (extract toolCallId + arguments)
 # -----------------------------
-def _try_json_loads(val: Any) -> Any:
-    if isinstance(val, str):
-        s = val.strip()
-        if (s.startswith("{") and s.endswith("}")) or (s.startswith("[") and s.endswith("]")):
-            try:
-                return json.loads(s)
-            except Exception:
-                return val
-    return val
+# Filled in when the tool call omits them (extra_metadata gets a fresh {} per request).
+VAPI_DEFAULTS = {
+    "to": RECIPIENT_EMAIL,
+    "urgency": "Normal",
+    "preferred_contact_method": None,
+    "resident_email": None,
+}
 
 
-def _extract_toolcall_and_args(raw: Any) -> Tuple[Optional[str], Dict[str, Any]]:
-    """
-    Supports common Vapi shapes:
-    - {"toolCalls":[{"id":"...", "function":{"arguments":"{...}"}}]}
-    - {"toolCallId":"...", "arguments":{...}}
-    - nested wrappers
-    Returns (toolCallId, args_dict)
-    """
-    raw = _try_json_loads(raw)
+# Typed view of the usual envelope. Decoding straight into these skips every
+# field we don't declare (call, artifact, assistant, ...) without building it.
+class _VapiFunction(msgspec.Struct):
+    arguments: Union[str, Dict[str, Any], None] = None
+
+
+class _VapiToolCall(msgspec.Struct):
+    id: Optional[str] = None
+    toolCallId: Optional[str] = None
+    function: Optional[_VapiFunction] = None
+
+
+# Keys whose mere presence sends the generic walk down a different branch.
+# Declared as Raw so they're detected without being decoded.
+_VAPI_ARG_KEY_NAMES = tuple(sorted(VAPI_ARG_KEYS))
+_VapiKeyPresence = msgspec.defstruct(
+    "_VapiKeyPresence",
+    [(k, Union[msgspec.Raw, msgspec.UnsetType], msgspec.UNSET) for k in _VAPI_ARG_KEY_NAMES + ("function",)],
+)
 
-    if isinstance(raw, dict):
-        # direct toolCallId patterns
-        tool_call_id = raw.get("toolCallId") or raw.get("tool_call_id")
 
-        # If direct args
-        if any(k in raw for k in ("to", "subject", "request_type", "resident_name", "resident_phone", "address", "details")):
-            return tool_call_id, raw
+class _VapiToolCallHolder(_VapiKeyPresence):
+    toolCallId: Optional[str] = None
+    tool_call_id: Optional[str] = None
+    toolCalls: Optional[List[_VapiToolCall]] = None
+    tool_calls: Optional[List[_VapiToolCall]] = None
+    toolCallList: Optional[List[_VapiToolCall]] = None
 
-        # toolCalls list
-        tc = raw.get("toolCalls") or raw.get("tool_calls") or raw.get("toolCallList")
-        if isinstance(tc, list) and len(tc) > 0:
+
+class _VapiEnvelope(_VapiToolCallHolder):
+    message: Optional[_VapiToolCallHolder] = None
+
+
+_vapi_decoder = msgspec.json.Decoder(_VapiEnvelope)
+# Struct fields lose key order, so "message comes first" is read off the body.
+_MESSAGE_FIRST = re.compile(rb'\s*\{\s*"message"\s*:')
+
+
+def _extract_from_envelope(env: _VapiEnvelope, body: bytes) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    """Same result as _vapi_unwrap.extract_known_shape, read off the typed envelope."""
+    container = env
+    outer_id = None
+    for depth in (0, 1):
+        if container is None or any(
+            getattr(container, k) is not msgspec.UNSET for k in _VAPI_ARG_KEY_NAMES
+        ):
+            return None
+        tool_call_id = container.toolCallId or container.tool_call_id
+        tc = container.toolCalls or container.tool_calls or container.toolCallList
+        if tc:
             first = tc[0]
-            if isinstance(first, dict):
-                tool_call_id = tool_call_id or first.get("id") or first.get("toolCallId")
-                fn = first.get("function") if isinstance(first.get("function"), dict) else None
-                if fn and "arguments" in fn:
-                    args = _try_json_loads(fn.get("arguments"))
-                    if isinstance(args, dict):
-                        return tool_call_id, args
-
-                # Sometimes args are directly under the tool call
-                if "arguments" in first:
-                    args = _try_json_loads(first.get("arguments"))
-                    if isinstance(args, dict):
-                        return tool_call_id, args
-
-        # function wrapper
-        if "function" in raw and isinstance(raw["function"], dict):
-            fn = raw["function"]
-            tool_call_id = tool_call_id or raw.get("id")
-            if "arguments" in fn:
-                args = _try_json_loads(fn.get("arguments"))
-                if isinstance(args, dict):
-                    return tool_call_id, args
-
-        # recurse all values
-        for v in raw.values():
-            tid, args = _extract_toolcall_and_args(v)
-            if args:
-                return tid or tool_call_id, args
-
-    if isinstance(raw, list):
-        for item in raw:
-            tid, args = _extract_toolcall_and_args(item)
-            if args:
+            if first.function is None:
+                return None
+            args = try_json_loads(first.function.arguments)
+            if type(args) is not dict:
+                return None
+            tid = tool_call_id or first.id or first.toolCallId
+            if depth == 0:
                 return tid, args
+            if not args:
+                return None
+            return tid or outer_id, args
+        if depth or container.function is not msgspec.UNSET or not _MESSAGE_FIRST.match(body):
+            return None
+        outer_id = tool_call_id
+        container = container.message
+    return None
+
 
-    return None, {}
+def _parse_vapi_body(body: bytes) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    """(toolCallId, args) from a webhook body, same as extract_vapi_args on the
+    decoded JSON; None if the body isn't valid JSON."""
+    try:
+        found = _extract_from_envelope(_vapi_decoder.decode(body), body)
+    except msgspec.ValidationError:
+        found = None  # valid JSON, unexpected shape: use the generic path
+    except msgspec.DecodeError:
+        return None
+    if found is None:
+        try:
+            raw = orjson.loads(body)
+        except Exception:
+            return None
+        found = extract_vapi_args(raw)
+    return found
 
 
 def _vapi_success(tool_call_id: Optional[str], msg: str):
     # Vapi requires "results" array.
-    return JSONResponse(
+    return ORJSONResponse(
         {"results": [{"toolCallId": tool_call_id or "unknown", "result": msg}]}
     )
 
 
 def _vapi_error(tool_call_id: Optional[str], msg: str):
     # Also return 200 with results so Vapi gets a result (prevents "no result returned")
-    return JSONResponse(
+    return ORJSONResponse(
         {"results": [{"toolCallId": tool_call_id or "unknown", "error": msg}]}
     )
 
 
+# -----------------------------
+# Vapi replay suppression
+# Vapi retries tool calls on timeout; remember recently lodged payloads so a
+# retry doesn't send the council a second email. Disk-backed so it is shared
+# by every worker process on the host (give each instance on a host its own
+# VAPI_IDEMPOTENCY_DIR).
+# -----------------------------
+VAPI_IDEMPOTENCY_TTL = 3600  # seconds
+VAPI_IDEMPOTENCY_DIR = os.environ.get("VAPI_IDEMPOTENCY_DIR", "/tmp/vapi_idem")
+_vapi_idem = diskcache.Cache(VAPI_IDEMPOTENCY_DIR, size_limit=50 * 1024 * 1024)
+
+
+def _vapi_idempotency_key(payload: Dict[str, Any]) -> str:
+    try:
+        canonical = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    except TypeError:
+        # orjson rejects ints wider than 64 bits, which msgspec decodes as-is.
+        canonical = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
 # -----------------------------
 # Vapi debug echo (so Swagger shows a body box)
 # -----------------------------
-@api_router.post("/vapi/debug/echo")
+# Echoes arbitrary input, so it keeps the stdlib encoder: orjson rejects ints
+# wider than 64 bits.
+@api_router.post("/vapi/debug/echo", response_class=JSONResponse)
 async def vapi_debug_echo(payload: Dict[str, Any] = Body(default_factory=dict)):
-    tool_call_id, extracted = _extract_toolcall_and_args(payload)
+    tool_call_id, extracted = extract_vapi_args(payload)
     return {"raw": payload, "toolCallId": tool_call_id, "extracted_args": extracted}
 
 
@@ -284,25 +603,24 @@ async def vapi_debug_echo(payload: Dict[str, Any] = Body(default_factory=dict)):
 # -----------------------------
 @api_router.post("/vapi/send-structured-email")
 async def vapi_send_structured_email(request: Request):
-    try:
-        raw = await request.json()
-    except Exception:
+    found = _parse_vapi_body(await request.body())
+    if found is None:
         # Must return Vapi-shaped result, not a bare 400, or Vapi will say "no result"
         return _vapi_error(None, "Invalid JSON body")
+    tool_call_id, payload = found
 
-    tool_call_id, payload = _extract_toolcall_and_args(raw)
-
-    required = ["subject", "request_type", "resident_name", "resident_phone", "address", "details"]
-    missing = [k for k in required if not payload.get(k)]
+    missing = [k for k in VAPI_REQUIRED_FIELDS if not payload.get(k)]
     if missing:
         return _vapi_error(tool_call_id, f"Missing required fields: {', '.join(missing)}")
 
-    # Optional / defaults
-    payload.setdefault("to", os.environ.get("RECIPIENT_EMAIL"))
-    payload.setdefault("urgency", "Normal")
-    payload.setdefault("preferred_contact_method", None)
-    payload.setdefault("resident_email", None)
-    payload.setdefault("extra_metadata", {})
+    idem_key = _vapi_idempotency_key(payload)
+    cached_reference = _vapi_idem.get(idem_key)
+    if cached_reference is not None:
+        logging.info("Duplicate Vapi request suppressed (reference %s)", cached_reference)
+        return _vapi_success(tool_call_id, f"Request lodged successfully. Reference: {cached_reference}")
+
+    # Optional / defaults, merged into a new dict: payload may be a memoized parse result
+    payload = {**VAPI_DEFAULTS, "extra_metadata": {}, **payload}
 
     # -----------------------------
     # ONLY CHANGE: static demo reference (instead of long UUID-based one)
@@ -310,14 +628,15 @@ async def vapi_send_structured_email(request: Request):
     reference_id = "YRC-123"
     payload["reference_id"] = reference_id
 
-    try:
-        send_council_request_email(payload)
-    except EmailDeliveryError as e:
-        logging.exception("EmailDeliveryError in Vapi endpoint")
-        return _vapi_error(tool_call_id, f"Email delivery failed: {str(e)}")
-    except Exception:
-        logging.exception("Unexpected error sending Vapi structured email")
-        return _vapi_error(tool_call_id, "Internal server error while sending email")
+    # Vapi only needs the result string; delivery (and retries) happen on the
+    # email workers so Brevo latency never reaches the call.
+    # If delivery ultimately fails, forget the key so Vapi's next retry is sent again.
+    if not _enqueue_email(app.state.email_queue, (
+        send_council_request_email, (payload,), 0, partial(_vapi_idem.delete, idem_key)
+    )):
+        # Not lodged: report it, and don't record the key so a retry can get through.
+        return _vapi_error(tool_call_id, "Unable to lodge the request right now. Please try again shortly.")
+    _vapi_idem.set(idem_key, reference_id, expire=VAPI_IDEMPOTENCY_TTL)
 
     # IMPORTANT: single-line string is safest for Vapi
     return _vapi_success(tool_call_id, f"Request lodged successfully. Reference: {reference_id}")
@@ -325,10 +644,33 @@ async def vapi_send_structured_email(request: Request):
 
 app.include_router(api_router)
 
+# Added before CORS so CORS stays the outermost layer.
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
+# Browsers reject "*" together with credentials, so origins are listed
+# explicitly (comma-separated CORS_ORIGINS), optionally widened by a regex
+# (CORS_ORIGIN_REGEX, e.g. for preview deploys). max_age lets them cache preflights.
+# There is no default: the deploy must name its frontend (checked at startup).
+CORS_ORIGINS = [o.strip() for o in os.environ.get("CORS_ORIGINS", "").split(",") if o.strip()]
+CORS_ORIGIN_REGEX = os.environ.get("CORS_ORIGIN_REGEX")
+
+
+class _BrowserCORSMiddleware(CORSMiddleware):
+    """CORS for the browser-facing routes only: Vapi webhooks are
+    server-to-server, so /api/vapi/* goes straight to the app."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/vapi/"):
+            return await self.app(scope, receive, send)
+        return await super().__call__(scope, receive, send)
+
+
 app.add_middleware(
-    CORSMiddleware,
+    _BrowserCORSMiddleware,
     allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
+    max_age=86400,
 )
@@ -0,0 +1,45 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The backend modules are imported as top-level modules (as uvicorn does).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# server/emails read their settings at import; give them a complete config
+# that never reaches a real Mongo or Brevo.
+os.environ.pop("MONGO_URL", None)
+os.environ.setdefault("BREVO_API_KEY", "test-key")
+os.environ.setdefault("SENDER_EMAIL", "sender@example.com")
+os.environ.setdefault("RECIPIENT_EMAIL", "inbox@example.com")
+os.environ.setdefault("CORS_ORIGINS", "http://localhost:5173")
+os.environ["VAPI_IDEMPOTENCY_DIR"] = tempfile.mkdtemp(prefix="vapi_idem_test_")
+atexit.register(shutil.rmtree, os.environ["VAPI_IDEMPOTENCY_DIR"], True)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Stub Brevo: every request body _send_transac_email would have posted."""
+    import emails
+
+    bodies = []
+
+    async def fake_send(body):
+        bodies.append(body)
+        return {"messageId": "test"}
+
+    monkeypatch.setattr(emails, "_send_transac_email", fake_send)
+    return bodies
+
+
+@pytest.fixture
+def client(sent):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as c:
+        yield c
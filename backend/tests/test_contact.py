@@ -0,0 +1,89 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import server
+
+
+def test_contact_accepts_plain_address(client):
+    r = client.post("/api/contact", json={"name": "A", "email": "a.b@mail.example.com", "message": "hi"})
+    assert r.status_code == 200
+    assert r.json()["status"] == "success"
+
+
+@pytest.mark.parametrize("email", ["nope", "a@b", "a@@b.com", "a b@c.com", "a@b..com", "a@.com", "a@b.com."])
+def test_contact_rejects_malformed_address(client, email):
+    r = client.post("/api/contact", json={"name": "A", "email": email, "message": "hi"})
+    assert r.status_code == 422
+
+
+def test_contact_rejects_long_pathological_address_quickly(client):
+    start = time.perf_counter()
+    r = client.post("/api/contact", json={"name": "A", "email": "a@" + "." * 40000 + "@", "message": "hi"})
+    assert r.status_code == 422
+    assert time.perf_counter() - start < 1
+
+
+def test_email_pattern_is_linear_on_pathological_input():
+    # Below the length cap this is the only guard; the old pattern took seconds here.
+    for bad in ("a@" + "." * 100000 + "@", "a@" + "b." * 50000 + "@"):
+        start = time.perf_counter()
+        assert server._EMAIL_RE.fullmatch(bad) is None
+        assert time.perf_counter() - start < 0.5
+
+
+class _FakeCollection:
+    def __init__(self, ttl_conflict):
+        self.ttl_conflict = ttl_conflict
+        self.indexes = []
+
+    async def create_index(self, key, **kwargs):
+        if key == "timestamp" and self.ttl_conflict:
+            raise OperationFailure("Index already exists with different options", code=85)
+        self.indexes.append((key, kwargs))
+
+
+class _FakeDb:
+    def __init__(self, ttl_conflict=False):
+        self.contact_submissions = _FakeCollection(ttl_conflict)
+        self.commands = []
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+def test_contact_indexes_created():
+    db = _FakeDb()
+    asyncio.run(server._ensure_contact_indexes(db))
+    assert db.contact_submissions.indexes == [
+        ("timestamp", {"expireAfterSeconds": server.CONTACT_RETENTION_DAYS * 86400}),
+        ("email", {}),
+        ("id", {}),
+    ]
+    assert db.commands == []
+
+
+def test_changed_retention_updates_existing_ttl_index():
+    db = _FakeDb(ttl_conflict=True)
+    asyncio.run(server._ensure_contact_indexes(db))
+    assert db.commands == [(
+        ("collMod", "contact_submissions"),
+        {"index": {"keyPattern": {"timestamp": 1}, "expireAfterSeconds": server.CONTACT_RETENTION_DAYS * 86400}},
+    )]
+    assert [key for key, _ in db.contact_submissions.indexes] == ["email", "id"]
+
+
+@pytest.mark.parametrize("days", ["0", "-30"])
+def test_non_positive_retention_is_rejected_at_startup(days):
+    env = {**os.environ, "CONTACT_RETENTION_DAYS": days}
+    r = subprocess.run(
+        [sys.executable, "-c", "import server"], cwd=os.path.dirname(server.__file__),
+        env=env, capture_output=True, text=True,
+    )
+    assert r.returncode != 0
+    assert "CONTACT_RETENTION_DAYS must be at least 1" in r.stderr
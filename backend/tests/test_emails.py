@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+import emails
+
+
+@pytest.fixture
+def batcher(sent):
+    """Run fn(sent) inside a started batcher; close_email_client runs afterwards."""
+
+    def run(fn):
+        async def main():
+            emails.start_email_batcher()
+            try:
+                return await fn(sent)
+            finally:
+                await emails.close_email_client()
+
+        return asyncio.run(main())
+
+    return run
+
+
+async def _until(cond, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def _queue(n):
+    for i in range(n):
+        assert emails.queue_contact_notification(f"N{i}", f"n{i}@example.com", "", f"message {i}")
+
+
+def test_queued_notifications_go_out_as_one_batch(batcher):
+    async def scenario(sent):
+        _queue(3)
+        await _until(lambda: sent)
+        await asyncio.sleep(emails._BATCH_WINDOW)
+        assert len(sent) == 1
+        versions = sent[0]["messageVersions"]
+        assert [v["to"] for v in versions] == [[{"email": emails._RECIPIENT_EMAIL}]] * 3
+        assert "message 0" in versions[0]["htmlContent"]
+        assert "message 2" in versions[2]["htmlContent"]
+
+    batcher(scenario)
+
+
+def test_single_notification_is_sent_without_message_versions(batcher):
+    async def scenario(sent):
+        _queue(1)
+        await _until(lambda: sent)
+        assert "messageVersions" not in sent[0]
+        assert "message 0" in sent[0]["htmlContent"]
+
+    batcher(scenario)
+
+
+def test_retryable_failure_is_requeued(batcher, monkeypatch):
+    monkeypatch.setattr(emails, "EMAIL_RETRY_DELAY", 0.01)
+    failures = [emails.EmailDeliveryError("Brevo API error: 503")]
+
+    async def scenario(sent):
+        async def flaky(body):
+            if failures:
+                raise failures.pop()
+            sent.append(body)
+
+        monkeypatch.setattr(emails, "_send_transac_email", flaky)
+        _queue(2)
+        await _until(lambda: sent)
+        assert len(sent[0]["messageVersions"]) == 2
+        assert not emails._retry_timers
+
+    batcher(scenario)
+
+
+def test_non_retryable_failure_is_dropped(batcher, monkeypatch, caplog):
+    async def rejected(body):
+        raise emails.EmailDeliveryError("Brevo API error: 400", retryable=False)
+
+    async def scenario(sent):
+        monkeypatch.setattr(emails, "_send_transac_email", rejected)
+        _queue(2)
+        await _until(lambda: not emails._pending and not emails._pending_ready.is_set())
+        await asyncio.sleep(emails._BATCH_WINDOW)
+        assert not emails._retry_timers
+        assert not emails._pending
+
+    batcher(scenario)
+    assert "dropping 2 message(s)" in caplog.text
+
+
+def test_retries_stop_after_max_attempts(batcher, monkeypatch):
+    monkeypatch.setattr(emails, "EMAIL_RETRY_DELAY", 0.001)
+    monkeypatch.setattr(emails, "EMAIL_MAX_RETRIES", 2)
+    calls = []
+
+    async def unavailable(body):
+        calls.append(body)
+        raise emails.EmailDeliveryError("Brevo API error: 503")
+
+    async def scenario(sent):
+        monkeypatch.setattr(emails, "_send_transac_email", unavailable)
+        _queue(1)
+        await _until(lambda: len(calls) == 3)
+        await asyncio.sleep(emails._BATCH_WINDOW * 2)
+        assert len(calls) == 3  # first attempt + 2 retries
+        assert not emails._retry_timers and not emails._pending
+
+    batcher(scenario)
+
+
+def test_close_flushes_pending(batcher, sent):
+    async def scenario(sent):
+        _queue(2)
+        assert sent == []  # closed before the batch window elapses
+
+    batcher(scenario)
+    assert len(sent) == 1 and len(sent[0]["messageVersions"]) == 2
+
+
+def test_batch_cancelled_mid_send_is_sent_at_close(sent, monkeypatch):
+    attempts = []
+
+    async def main():
+        in_flight = asyncio.Event()
+
+        async def slow(body):
+            attempts.append(body)
+            if len(attempts) == 1:
+                in_flight.set()
+                await asyncio.sleep(3600)  # cancelled by close_email_client
+            sent.append(body)
+
+        monkeypatch.setattr(emails, "_send_transac_email", slow)
+        emails.start_email_batcher()
+        _queue(2)
+        await in_flight.wait()
+        await emails.close_email_client()
+
+    asyncio.run(main())
+    assert len(attempts) == 2
+    assert len(sent) == 1 and len(sent[0]["messageVersions"]) == 2
+
+
+def test_close_drops_batches_awaiting_retry(batcher, monkeypatch, caplog):
+    async def unavailable(body):
+        raise emails.EmailDeliveryError("Brevo API error: 503")
+
+    async def scenario(sent):
+        monkeypatch.setattr(emails, "_send_transac_email", unavailable)
+        _queue(2)
+        await _until(lambda: emails._retry_timers)
+        assert sum(len(items) for items in emails._retry_timers.values()) == 2
+
+    batcher(scenario)
+    assert not emails._retry_timers
+    assert "2 contact email(s) awaiting retry" in caplog.text
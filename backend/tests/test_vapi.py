@@ -0,0 +1,169 @@
+import json
+import random
+import time
+
+import diskcache
+import orjson
+import pytest
+
+import server
+from vapi_reference import ENVELOPES, random_envelope, random_vapi_envelope, reference_extract
+
+ARGS = {
+    "subject": "Missed bin",
+    "request_type": "Waste",
+    "resident_name": "Sam",
+    "resident_phone": "0400000000",
+    "address": "1 Main St",
+    "details": "Not collected",
+}
+
+
+@pytest.fixture
+def idem(tmp_path, monkeypatch):
+    """A fresh replay cache per test."""
+    cache = diskcache.Cache(str(tmp_path / "vapi_idem"))
+    monkeypatch.setattr(server, "_vapi_idem", cache)
+    yield cache
+    cache.close()
+
+
+def _tool_call(args, call_id="call_1"):
+    return {"message": {"toolCalls": [{"id": call_id, "function": {"name": "send", "arguments": args}}]}}
+
+
+@pytest.mark.parametrize("big", [2**64, -(2**70), 1180591620717411303424])
+def test_idempotency_key_accepts_wide_ints(big):
+    key = server._vapi_idempotency_key({**ARGS, "big": big})
+    assert key == server._vapi_idempotency_key({"big": big, **ARGS})
+    assert key != server._vapi_idempotency_key({**ARGS, "big": big + 1})
+
+
+def test_webhook_with_wide_int_argument_is_lodged(client, idem):
+    r = client.post("/api/vapi/send-structured-email", json=_tool_call({**ARGS, "big": 1180591620717411303424}))
+    assert r.status_code == 200
+    result = r.json()["results"][0]
+    assert result["toolCallId"] == "call_1"
+    assert result["result"].startswith("Request lodged successfully.")
+
+
+# The handler reads the usual envelope through msgspec structs
+# (_extract_from_envelope) before falling back to extract_vapi_args; together
+# they must still match the original walker, key order included.
+def _bodies(raw):
+    return json.dumps(raw).encode(), orjson.dumps(raw), json.dumps(raw, indent=2).encode()
+
+
+@pytest.mark.parametrize("raw", list(ENVELOPES.values()), ids=list(ENVELOPES))
+def test_parse_body_matches_reference(raw):
+    expected = reference_extract(raw)
+    for body in _bodies(raw):
+        assert server._parse_vapi_body(body) == expected
+
+
+def test_parse_body_reads_usual_envelope_off_structs():
+    body = json.dumps(ENVELOPES["message.toolCalls, string args"]).encode()
+    found = server._extract_from_envelope(server._vapi_decoder.decode(body), body)
+    assert found == reference_extract(json.loads(body))
+
+
+def test_parse_body_matches_reference_on_random_envelopes():
+    rng = random.Random(4321)
+    for i in range(10000):
+        raw = random_vapi_envelope(rng) if i % 2 else random_envelope(rng, 5)
+        expected = reference_extract(raw)
+        for body in _bodies(raw):
+            assert server._parse_vapi_body(body) == expected, body
+
+
+def test_parse_body_rejects_invalid_json():
+    assert server._parse_vapi_body(b"nope") is None
+    assert server._parse_vapi_body(b'{"message": ') is None
+
+
+def test_shutdown_gives_up_on_pending_retries(sent, idem, monkeypatch, caplog):
+    from fastapi.testclient import TestClient
+
+    import emails
+
+    async def unavailable(body):
+        raise emails.EmailDeliveryError("Brevo API error: 503")
+
+    monkeypatch.setattr(emails, "_send_transac_email", unavailable)
+    with TestClient(server.app) as c:
+        r = c.post("/api/vapi/send-structured-email", json=_tool_call(ARGS))
+        assert r.json()["results"][0]["result"].startswith("Request lodged successfully.")
+        key = server._vapi_idempotency_key(ARGS)
+        assert idem.get(key) is not None
+    # The failed send's retry was still waiting on its timer at shutdown.
+    assert idem.get(key) is None
+    assert not server.app.state.email_retries
+    assert "1 email retry(ies) pending" in caplog.text
+
+
+def _lodge(c, args=ARGS, call_id="call_1"):
+    return c.post("/api/vapi/send-structured-email", json=_tool_call(args, call_id)).json()["results"][0]
+
+
+def test_duplicate_returns_cached_reference_without_sending(sent, idem):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as c:
+        first = _lodge(c)
+        # Vapi's retry carries a new call id but the same arguments.
+        second = _lodge(c, call_id="call_2")
+    assert first == {"toolCallId": "call_1", "result": "Request lodged successfully. Reference: YRC-123"}
+    assert second == {"toolCallId": "call_2", "result": "Request lodged successfully. Reference: YRC-123"}
+    assert len(sent) == 1
+
+
+def test_full_queue_reports_error_and_does_not_record_key(client, idem, monkeypatch):
+    monkeypatch.setattr(server, "_enqueue_email", lambda queue, job: False)
+    result = _lodge(client)
+    assert result == {
+        "toolCallId": "call_1",
+        "error": "Unable to lodge the request right now. Please try again shortly.",
+    }
+    assert server._vapi_idempotency_key(ARGS) not in idem
+
+
+def test_enqueue_email_reports_full_queue():
+    import asyncio
+
+    queue = asyncio.Queue(maxsize=1)
+    job = (server.send_council_request_email, (ARGS,), 0, None)
+    assert server._enqueue_email(queue, job)
+    assert not server._enqueue_email(queue, job)
+
+
+def test_giving_up_forgets_key_so_retry_is_sent(client, sent, idem, monkeypatch):
+    import emails
+
+    async def rejected(body):
+        raise emails.EmailDeliveryError("Brevo API error: 400", retryable=False)
+
+    monkeypatch.setattr(emails, "_send_transac_email", rejected)
+    assert _lodge(client)["result"].startswith("Request lodged successfully.")
+    key = server._vapi_idempotency_key(ARGS)
+    deadline = time.monotonic() + 2
+    while key in idem:
+        assert time.monotonic() < deadline, "replay key was not deleted"
+        time.sleep(0.01)
+
+    async def accepted(body):
+        sent.append(body)
+
+    monkeypatch.setattr(emails, "_send_transac_email", accepted)
+    assert _lodge(client)["result"].startswith("Request lodged successfully.")
+    deadline = time.monotonic() + 2
+    while not sent:
+        assert time.monotonic() < deadline, "retry was not sent"
+        time.sleep(0.01)
+    assert key in idem
+
+
+def test_debug_echo_handles_wide_ints(client):
+    body = _tool_call({**ARGS, "big": 1180591620717411303424})
+    r = client.post("/api/vapi/debug/echo", json=body)
+    assert r.status_code == 200
+    assert r.json() == {"raw": body, "toolCallId": "call_1", "extracted_args": {**ARGS, "big": 1180591620717411303424}}
@@ -0,0 +1,34 @@
+"""
+extract_vapi_args must return exactly what the original recursive walker did;
+the fast path and the stack walk are only optimizations of it.
+"""
+import random
+
+import pytest
+
+from _vapi_unwrap import extract_known_shape, extract_toolcall_and_args, extract_vapi_args
+from vapi_reference import ARGS, ENVELOPES, random_envelope, reference_extract
+
+
+@pytest.mark.parametrize("raw", list(ENVELOPES.values()), ids=list(ENVELOPES))
+def test_matches_reference(raw):
+    expected = reference_extract(raw)
+    assert extract_vapi_args(raw) == expected
+    assert extract_toolcall_and_args(raw) == expected
+
+
+def test_fast_path_taken_for_usual_envelope():
+    raw = ENVELOPES["message.toolCalls, string args"]
+    assert extract_known_shape(raw) == ("call_1", ARGS)
+
+
+def test_fast_path_defers_on_mixed_args():
+    assert extract_known_shape(ENVELOPES["mixed top-level args and toolCalls"]) is None
+
+
+def test_matches_reference_on_random_envelopes():
+    rng = random.Random(1234)
+    for _ in range(5000):
+        raw = random_envelope(rng, 5)
+        expected = reference_extract(raw)
+        assert extract_vapi_args(raw) == expected, raw
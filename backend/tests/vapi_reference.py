@@ -0,0 +1,208 @@
+"""
+Reference for the Vapi argument extraction tests: the original recursive
+walker (frozen from server.py), representative envelopes, and a generator
+of random envelopes for differential runs.
+"""
+import json
+import random
+from typing import Any, Dict, Optional, Tuple
+
+
+def _reference_json_loads(val: Any) -> Any:
+    if isinstance(val, str):
+        s = val.strip()
+        if (s.startswith("{") and s.endswith("}")) or (s.startswith("[") and s.endswith("]")):
+            try:
+                return json.loads(s)
+            except Exception:
+                return val
+    return val
+
+
+def reference_extract(raw: Any) -> Tuple[Optional[str], Dict[str, Any]]:
+    # The original recursive walker from server.py, frozen as the reference.
+    raw = _reference_json_loads(raw)
+
+    if isinstance(raw, dict):
+        tool_call_id = raw.get("toolCallId") or raw.get("tool_call_id")
+
+        if any(k in raw for k in ("to", "subject", "request_type", "resident_name", "resident_phone", "address", "details")):
+            return tool_call_id, raw
+
+        tc = raw.get("toolCalls") or raw.get("tool_calls") or raw.get("toolCallList")
+        if isinstance(tc, list) and len(tc) > 0:
+            first = tc[0]
+            if isinstance(first, dict):
+                tool_call_id = tool_call_id or first.get("id") or first.get("toolCallId")
+                fn = first.get("function") if isinstance(first.get("function"), dict) else None
+                if fn and "arguments" in fn:
+                    args = _reference_json_loads(fn.get("arguments"))
+                    if isinstance(args, dict):
+                        return tool_call_id, args
+
+                if "arguments" in first:
+                    args = _reference_json_loads(first.get("arguments"))
+                    if isinstance(args, dict):
+                        return tool_call_id, args
+
+        if "function" in raw and isinstance(raw["function"], dict):
+            fn = raw["function"]
+            tool_call_id = tool_call_id or raw.get("id")
+            if "arguments" in fn:
+                args = _reference_json_loads(fn.get("arguments"))
+                if isinstance(args, dict):
+                    return tool_call_id, args
+
+        for v in raw.values():
+            tid, args = reference_extract(v)
+            if args:
+                return tid or tool_call_id, args
+
+    if isinstance(raw, list):
+        for item in raw:
+            tid, args = reference_extract(item)
+            if args:
+                return tid, args
+
+    return None, {}
+
+
+ARGS = {
+    "subject": "Missed bin",
+    "request_type": "Waste",
+    "resident_name": "Sam",
+    "resident_phone": "0400000000",
+    "address": "1 Main St",
+    "details": "Not collected",
+}
+ARGS_JSON = json.dumps(ARGS)
+
+ENVELOPES = {
+    "message.toolCalls, string args": {
+        "message": {"type": "tool-calls", "toolCalls": [{"id": "call_1", "type": "function", "function": {"name": "send", "arguments": ARGS_JSON}}]},
+    },
+    "message.toolCallList, dict args": {
+        "message": {"toolCallList": [{"id": "call_2", "function": {"name": "send", "arguments": ARGS}}]},
+    },
+    "message.tool_calls, padded string args": {
+        "message": {"tool_calls": [{"id": "call_3", "function": {"arguments": "  " + ARGS_JSON + "\n"}}]},
+    },
+    "message not first": {
+        "call": {"id": "c"},
+        "message": {"toolCalls": [{"id": "call_4", "function": {"arguments": ARGS_JSON}}]},
+    },
+    "args in a key before message": {
+        "artifact": {"toolCallId": "earlier", "arguments": {"subject": "Earlier"}},
+        "message": {"toolCalls": [{"id": "call_17", "function": {"arguments": ARGS_JSON}}]},
+    },
+    "outer toolCallId around message": {
+        "toolCallId": "outer",
+        "message": {"toolCalls": [{"function": {"arguments": ARGS_JSON}}]},
+    },
+    "message with empty args": {
+        "message": {"toolCalls": [{"id": "call_5", "function": {"arguments": "{}"}}]},
+        "fallback": {"toolCallId": "call_6", "arguments": {"subject": "S"}},
+    },
+    "top-level toolCalls with toolCallId": {
+        "toolCallId": "top",
+        "toolCalls": [{"id": "call_7", "function": {"arguments": ARGS_JSON}}],
+    },
+    "top-level toolCalls, empty args": {
+        "toolCalls": [{"id": "call_8", "function": {"arguments": "{}"}}],
+    },
+    "arguments directly on the tool call": {
+        "toolCalls": [{"toolCallId": "call_9", "arguments": ARGS_JSON}],
+    },
+    "direct args": {"toolCallId": "call_10", **ARGS},
+    "mixed top-level args and toolCalls": {
+        "to": "x@example.com",
+        "toolCalls": [{"id": "a", "function": {"arguments": "{}"}}],
+    },
+    "mixed args inside message": {
+        "message": {"subject": "S", "toolCalls": [{"id": "b", "function": {"arguments": ARGS_JSON}}]},
+    },
+    "function wrapper": {"id": "call_11", "function": {"name": "send", "arguments": ARGS_JSON}},
+    "function beside message": {
+        "message": {"toolCalls": [{"id": "call_12", "function": {"arguments": ARGS_JSON}}]},
+        "function": {"arguments": "{}"},
+    },
+    "nested wrapper": {"data": {"payload": [{"toolCalls": [{"id": "call_13", "function": {"arguments": ARGS_JSON}}]}]}},
+    "JSON string body": json.dumps({"message": {"toolCalls": [{"id": "call_14", "function": {"arguments": ARGS_JSON}}]}}),
+    "list body": [{"nothing": 1}, {"toolCallId": "call_15", "arguments": ARGS}],
+    "no args": {"nothing": 1},
+    "empty toolCalls": {"toolCalls": []},
+    "toolCalls not a list": {"toolCalls": {"id": "x", "function": {"arguments": ARGS_JSON}}},
+    "unparseable arguments": {"message": {"toolCalls": [{"id": "call_16", "function": {"arguments": "{not json}"}}]}},
+    "falsy root id": {"toolCallId": "", "message": {"toolCalls": [{"function": {"arguments": ARGS_JSON}}]}},
+    "falsy nested id": {"toolCallId": "", "data": {"toolCallId": 0, "arguments": ARGS}},
+    "not JSON": "nope",
+    "null": None,
+}
+
+
+_KEYS = ["message", "toolCalls", "tool_calls", "toolCallList", "toolCallId", "tool_call_id",
+         "function", "arguments", "id", "to", "subject", "data"]
+_LEAVES = ["", "x", "call", 0, 1, None, True, "{}", "[]", "{bad", '{"subject": "S"}', ARGS_JSON]
+
+
+def random_envelope(rng: random.Random, depth: int) -> Any:
+    roll = rng.random()
+    if depth <= 0 or roll < 0.3:
+        return rng.choice(_LEAVES)
+    if roll < 0.45:
+        return [random_envelope(rng, depth - 1) for _ in range(rng.randint(0, 3))]
+    node = {k: random_envelope(rng, depth - 1) for k in rng.sample(_KEYS, rng.randint(0, 4))}
+    return json.dumps(node) if roll > 0.95 else node
+
+
+_IDS = ["", "call_a", "call_b", None, "call_c"]
+_ARGUMENTS = ["{}", ARGS_JSON, " " + ARGS_JSON, "{bad", "[]", {}, ARGS, {"subject": "S"}, None]
+
+
+def _random_holder(rng: random.Random, depth: int) -> Dict[str, Any]:
+    # A toolCalls holder close to what Vapi sends, with the odd key or value
+    # that sends the walk down another branch.
+    items = []
+    for _ in range(rng.choice([0, 1, 1, 1, 2])):
+        item: Dict[str, Any] = {}
+        keys = rng.sample(["id", "toolCallId", "arguments", "type"], rng.randint(0, 3))
+        if rng.random() < 0.85:
+            keys.insert(rng.randint(0, len(keys)), "function")
+        for k in keys:
+            if k == "function":
+                item[k] = rng.choice([{"name": "send", "arguments": rng.choice(_ARGUMENTS)}, {"name": "send"}, None])
+            elif k == "arguments":
+                item[k] = rng.choice(_ARGUMENTS)
+            else:
+                item[k] = rng.choice(_IDS) if k != "type" else "function"
+        items.append(item)
+    holder: Dict[str, Any] = {}
+    keys = ["toolCallId", "tool_call_id", rng.choice(["toolCalls", "tool_calls", "toolCallList"]), "call", "type"]
+    if rng.random() < 0.15:
+        keys.append(rng.choice(["to", "subject", "details"]))
+    if rng.random() < 0.15:
+        keys.append("function")
+    if depth and rng.random() < 0.8:
+        keys.append("message")
+    for k in rng.sample(keys, rng.randint(1, len(keys))):
+        if k == "message":
+            holder[k] = _random_holder(rng, depth - 1)
+        elif k in ("toolCalls", "tool_calls", "toolCallList"):
+            holder[k] = items
+        elif k == "function":
+            holder[k] = {"arguments": rng.choice(_ARGUMENTS)}
+        elif k == "call":
+            holder[k] = {"id": "c", "toolCallId": rng.choice(_IDS)}
+            if rng.random() < 0.3:
+                holder[k]["arguments"] = rng.choice(_ARGUMENTS)
+        else:
+            holder[k] = rng.choice(_IDS) if k in ("toolCallId", "tool_call_id") else "x"
+    return holder
+
+
+def random_vapi_envelope(rng: random.Random) -> Dict[str, Any]:
+    """A Vapi-like webhook body; "message" comes first about half the time."""
+    env = _random_holder(rng, 1)
+    if "message" in env and rng.random() < 0.5:
+        env = {"message": env.pop("message"), **env}
+    return env